@@ -1,21 +1,23 @@
 #!/usr/bin/env python3
 """
-Converte todos arquivos .ods para .csv, junta todos os csv em um único csv,
+Converte todos arquivos .ods e .xlsx para .csv, junta todos os csv em um único csv,
 remove duplicados onde nome e data são iguais, e separa em arquivos por valor
 na coluna 'encaminhado'.
 
 Uso: python convert_merge_split.py --input-dir <pasta> --output-dir <pasta_destino>
 
 Observações:
-- Suporta arquivos .ods. Se um .ods tiver múltiplas planilhas, cada planilha
+- Suporta arquivos .ods e .xlsx. Se um .ods tiver múltiplas planilhas, cada planilha
   será salva como CSV separado com sufixo da aba.
 - Para remoção de duplicados, considera as colunas 'nome' e 'data' (case-insensitive).
 - Para separar por encaminhado, considera a coluna 'encaminhado' (case-insensitive).
 """
 import argparse
 import csv
+import datetime
 import os
 import sys
+from itertools import chain, islice
 from pathlib import Path
 
 try:
@@ -23,6 +25,11 @@ try:
 except Exception:
     ezodf = None
 
+try:
+    import openpyxl
+except Exception:
+    openpyxl = None
+
 try:
     import pandas as pd
 except Exception:
@@ -33,6 +40,8 @@ def ensure_dependencies():
     missing = []
     if ezodf is None:
         missing.append('ezodf')
+    if openpyxl is None:
+        missing.append('openpyxl')
     if pd is None:
         missing.append('pandas')
     if missing:
@@ -41,85 +50,143 @@ def ensure_dependencies():
         sys.exit(1)
 
 
-def ods_to_csv(ods_path: Path, out_dir: Path):
-    """Converte um arquivo .ods para um ou mais CSVs (uma por planilha)."""
-    doc = ezodf.opendoc(ods_path)
-    created = []
-    for sheet in doc.sheets:
-        if sheet.nrows() == 0:
-            continue
-            
-        # Encontra o cabeçalho
-        header_row = None
-        data_start_row = 0
-        
-        for r in range(min(5, sheet.nrows())):  # Procura nas primeiras 5 linhas
-            row_data = []
-            for c in range(sheet.ncols()):
-                cell = sheet[r, c]
-                val = cell.value
-                if val is not None:
-                    row_data.append(str(val).strip().lower())
-                else:
-                    row_data.append('')
-            
-            # Verifica se esta linha parece ser um cabeçalho
-            if any('paciente' in cell or 'nome' in cell for cell in row_data):
-                header_row = r
-                data_start_row = r + 1
-                break
-        
-        if header_row is None:
-            # Se não encontrou cabeçalho, assume linha 0
-            header_row = 0
-            data_start_row = 1
-        
-        # Extrai dados
-        all_rows = []
-        
+STANDARD_HEADER = ['Pacientes', 'Tipo de Alta', 'Telefone', 'Dia Alta', 'Cid', 'Endereço', 'Encaminhado']
+
+# Número de linhas iniciais em que o cabeçalho é procurado
+HEADER_SEARCH_ROWS = 5
+
+
+def format_cell(val):
+    """Converte o valor de uma célula para texto (datas em YYYY-MM-DD)."""
+    if val is None:
+        return ''
+    # Format dates properly (datetime.datetime é subclasse de datetime.date)
+    if isinstance(val, datetime.date):
+        return val.strftime('%Y-%m-%d')
+    # Horários (datetime.time do openpyxl) não têm data: mantém HH:MM:SS
+    if isinstance(val, datetime.time):
+        return val.isoformat()
+    return str(val).strip()
+
+
+def safe_sheet_name(name):
+    return ''.join(ch if ch.isalnum() or ch in (' ', '_', '-') else '_' for ch in name)
+
+
+def rows_to_csv(rows, out_path: Path):
+    """Detecta o cabeçalho, processa as linhas e grava o CSV padronizado.
+
+    `rows` é um iterável de listas de strings (já formatadas com format_cell).
+    As linhas são consumidas e gravadas uma a uma, sem carregar a planilha
+    inteira em memória. Retorna o número de linhas de dados gravadas; se não
+    houver nenhuma, o arquivo não é mantido.
+    """
+    rows = iter(rows)
+
+    # Encontra o cabeçalho (procura nas primeiras linhas)
+    head = list(islice(rows, HEADER_SEARCH_ROWS))
+    if not head:
+        return 0
+
+    data_start_row = None
+    for r, row_data in enumerate(head):
+        # Verifica se esta linha parece ser um cabeçalho
+        if any('paciente' in cell.lower() or 'nome' in cell.lower() for cell in row_data):
+            data_start_row = r + 1
+            break
+
+    if data_start_row is None:
+        # Se não encontrou cabeçalho, assume linha 0
+        data_start_row = 1
+
+    written = 0
+    with out_path.open('w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
         # Adiciona cabeçalho padronizado
-        standard_header = ['Pacientes', 'Tipo de Alta', 'Telefone', 'Dia Alta', 'Cid', 'Endereço', 'Encaminhado']
-        all_rows.append(standard_header)
-        
-        for r in range(data_start_row, sheet.nrows()):
-            row = []
-            for c in range(sheet.ncols()):
-                cell = sheet[r, c]
-                val = cell.value
-                if val is None:
-                    row.append('')
-                else:
-                    # Format dates properly
-                    if hasattr(val, 'strftime'):
-                        row.append(val.strftime('%Y-%m-%d'))
-                    else:
-                        row.append(str(val).strip())
-            
+        writer.writerow(STANDARD_HEADER)
+
+        for row in chain(head[data_start_row:], rows):
             # Processa a linha e pode gerar múltiplas linhas
             processed_rows = process_data_row(row)
             for processed_row in processed_rows:
                 if processed_row and any(cell.strip() for cell in processed_row):
                     # Padroniza para 7 colunas
-                    while len(processed_row) < len(standard_header):
+                    while len(processed_row) < len(STANDARD_HEADER):
                         processed_row.append('')
-                    processed_row = processed_row[:len(standard_header)]
-                    
+                    processed_row = processed_row[:len(STANDARD_HEADER)]
+
                     # Só adiciona se tem nome de paciente
                     if processed_row[0].strip():
-                        all_rows.append(processed_row)
-        
-        # Only save if there are meaningful rows
-        if len(all_rows) > 1:  # At least header + 1 data row
-            # Determine filename - só salva a primeira planilha (Plan1)
-            safe_sheet = ''.join(ch if ch.isalnum() or ch in (' ', '_', '-') else '_' for ch in sheet.name)
-            if 'plan1' in safe_sheet.lower() or sheet == doc.sheets[0]:
-                out_name = ods_path.stem + '__' + safe_sheet + '.csv'
-                out_path = out_dir / out_name
-                with out_path.open('w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    for r in all_rows:
-                        writer.writerow(r)
+                        writer.writerow(processed_row)
+                        written += 1
+
+    # Only keep the file if there are meaningful rows
+    if written == 0:
+        out_path.unlink()
+    return written
+
+
+def ods_to_csv(ods_path: Path, out_dir: Path):
+    """Converte um arquivo .ods para um ou mais CSVs (uma por planilha)."""
+    doc = ezodf.opendoc(ods_path)
+    created = []
+    for index, sheet in enumerate(doc.sheets):
+        if sheet.nrows() == 0:
+            continue
+
+        # Só salva a primeira planilha (Plan1)
+        safe_sheet = safe_sheet_name(sheet.name)
+        if not ('plan1' in safe_sheet.lower() or index == 0):
+            continue
+
+        nrows, ncols = sheet.nrows(), sheet.ncols()
+        rows = ([format_cell(sheet[r, c].value) for c in range(ncols)] for r in range(nrows))
+
+        out_path = out_dir / (ods_path.stem + '__' + safe_sheet + '.csv')
+        if rows_to_csv(rows, out_path):
+            created.append(out_path)
+    return created
+
+
+def iter_xlsx_rows(ws):
+    """Itera as linhas de uma planilha openpyxl em modo read-only.
+
+    Muitos exports declaram uma dimensão (max_row/max_column) muito maior que
+    os dados reais por causa de formatação em células vazias. As dimensões
+    declaradas são descartadas para que o openpyxl não preencha cada linha até
+    a última coluna fantasma, e as células vazias do final de cada linha são
+    removidas antes da formatação.
+    """
+    ws.reset_dimensions()
+    for values in ws.iter_rows(values_only=True):
+        end = len(values)
+        while end and (values[end - 1] is None or values[end - 1] == ''):
+            end -= 1
+        yield [format_cell(val) for val in values[:end]]
+
+
+def xlsx_to_csv(xlsx_path: Path, out_dir: Path):
+    """Converte um arquivo .xlsx para um ou mais CSVs (uma por planilha).
+
+    Usa o modo read-only do openpyxl: as linhas são lidas em streaming e a
+    pasta de trabalho nunca é carregada inteira em memória.
+    """
+    wb = openpyxl.load_workbook(xlsx_path, read_only=True, data_only=True)
+    created = []
+    try:
+        for index, ws in enumerate(wb.worksheets):
+            # Só salva a primeira planilha (Plan1)
+            safe_sheet = safe_sheet_name(ws.title)
+            if not ('plan1' in safe_sheet.lower() or index == 0):
+                continue
+
+            # Sufixo _xlsx evita sobrescrever o CSV de um .ods com o mesmo nome
+            out_path = out_dir / (xlsx_path.stem + '_xlsx__' + safe_sheet + '.csv')
+            if rows_to_csv(iter_xlsx_rows(ws), out_path):
                 created.append(out_path)
+    finally:
+        # Read-only mantém o arquivo aberto até ser fechado explicitamente
+        wb.close()
     return created
 
 
@@ -219,8 +286,10 @@ def process_data_row(row):
 
 def find_files(input_dir: Path):
     ods = list(input_dir.rglob('*.ods'))
+    # Ignora arquivos temporários de lock do Excel (~$arquivo.xlsx)
+    xlsx = [p for p in input_dir.rglob('*.xlsx') if not p.name.startswith('~$')]
     csvs = list(input_dir.rglob('*.csv'))
-    return ods, csvs
+    return ods, xlsx, csvs
 
 
 def concat_csvs(csv_paths, out_path: Path):
@@ -370,8 +439,8 @@ def split_by_encaminhado(df, output_dir: Path):
 
 
 def main():
-    parser = argparse.ArgumentParser(description='Converter .ods→.csv, concatenar, deduplicar e dividir por encaminhado')
-    parser.add_argument('--input-dir', '-i', default=None, help='Pasta com arquivos .ods/.csv (padrão: ./Arquivos)')
+    parser = argparse.ArgumentParser(description='Converter .ods/.xlsx→.csv, concatenar, deduplicar e dividir por encaminhado')
+    parser.add_argument('--input-dir', '-i', default=None, help='Pasta com arquivos .ods/.xlsx/.csv (padrão: ./Arquivos)')
     parser.add_argument('--output-dir', '-o', default=None, help='Pasta de saída para arquivos resultantes (padrão: ./output)')
     parser.add_argument('--temp-dir', '-t', default=None, help='Pasta temporária para CSVs convertidos (padrão: output-dir/temp_csvs)')
     args = parser.parse_args()
@@ -390,8 +459,8 @@ def main():
 
     ensure_dependencies()
 
-    ods_files, csv_files = find_files(input_dir)
-    print(f'Encontrado {len(ods_files)} .ods e {len(csv_files)} .csv em {input_dir}')
+    ods_files, xlsx_files, csv_files = find_files(input_dir)
+    print(f'Encontrado {len(ods_files)} .ods, {len(xlsx_files)} .xlsx e {len(csv_files)} .csv em {input_dir}')
 
     temp_dir.mkdir(parents=True, exist_ok=True)
 
@@ -400,6 +469,11 @@ def main():
         created = ods_to_csv(ods, temp_dir)
         print(f'Convertido {ods} -> {len(created)} CSV(s)')
 
+    # convert xlsx
+    for xlsx in xlsx_files:
+        created = xlsx_to_csv(xlsx, temp_dir)
+        print(f'Convertido {xlsx} -> {len(created)} CSV(s)')
+
     # collect csvs from temp_dir and input_dir
     all_csvs = list(temp_dir.rglob('*.csv')) + csv_files
     print(f'Total CSVs para concatenar: {len(all_csvs)}')